@@ -0,0 +1,62 @@
+"""Gunicorn settings for running XRechnung Viewer across CPU cores
+
+saxonche runs XSLT transformations while holding the GIL, so threads in one
+process can't use more than one core. Each worker is a separate process
+instead; the app is not preloaded, so every worker imports it after the
+fork and gets its own Saxon processor, stylesheet cache and FOP JVM.
+
+Every worker therefore holds its own JVM heap for FOP on top of Saxon, up
+to XR_FOP_MAX_HEAP (default 512m) each, so size XR_WORKERS to the memory
+available as well as to the CPUs.
+
+    gunicorn -c gunicorn.conf.py xrechnung_viewer:app
+"""
+
+import math
+import os
+
+# Default worker limit; each worker carries its own JVM, so XR_WORKERS has to
+# be set explicitly to go beyond it
+MAX_DEFAULT_WORKERS = 4
+
+
+def available_cpus():
+    """CPUs this process may use, honouring affinity and a cgroup CPU quota
+
+    os.cpu_count() reports every host CPU, even inside a container limited
+    with --cpus.
+    """
+    try:
+        cpus = len(os.sched_getaffinity(0))
+    except AttributeError:
+        cpus = os.cpu_count() or 1
+
+    try:
+        with open("/sys/fs/cgroup/cpu.max") as f:
+            quota, period = f.read().split()[:2]
+        if quota != "max":
+            cpus = min(cpus, math.ceil(int(quota) / int(period)))
+    except (OSError, ValueError):
+        pass
+
+    return max(cpus, 1)
+
+
+bind = f"0.0.0.0:{os.environ.get('XR_PORT', '4242')}"
+workers = int(
+    os.environ.get("XR_WORKERS", min(available_cpus(), MAX_DEFAULT_WORKERS))
+)
+worker_class = "sync"
+preload_app = False
+# Warm-up and the first PDF start a JVM, which can take a while
+timeout = 120
+
+
+def post_worker_init(worker):
+    """Warm up Saxon and FOP in each worker once the app is loaded"""
+    from xrechnung_viewer import warm_up
+
+    try:
+        warm_up()
+    except Exception as e:
+        worker.log.warning(f"Warm-up failed: {e}")
@@ -164,19 +164,19 @@ async function handleFile(file) {
             body: formData
         });
 
-        const result = await response.json();
-
         if (!response.ok) {
-            throw new Error(result.error || 'Transformation failed');
+            const error = await response.json();
+            throw new Error(error.error || 'Transformation failed');
         }
 
-        currentHtml = result.html;
+        currentHtml = await response.text();
+        const filename = decodeURIComponent(response.headers.get('X-Filename') || '') || file.name;
 
         preview.srcdoc = currentHtml;
         preview.classList.add('show');
 
         dropZone.classList.add('success');
-        showStatus('success', `Erfolgreich geladen: <span class="filename">${file.name}</span>`);
+        showStatus('success', `Erfolgreich geladen: <span class="filename">${filename}</span>`);
 
         openNewTabBtn.disabled = false;
         savePdfBtn.disabled = !window.HAS_FOP;
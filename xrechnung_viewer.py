@@ -1,22 +1,36 @@
+import atexit
+import hashlib
+import io
 import os
+import re
 import sys
 import tempfile
 import subprocess
 import shutil
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
 from pathlib import Path
-from flask import Flask, render_template, request, jsonify, Response, send_file
+from urllib.parse import quote
+from flask import (
+    Flask,
+    render_template,
+    request,
+    jsonify,
+    Response,
+    send_file,
+)
 
 try:
-    from lxml import etree
+    from saxonche import PySaxonProcessor
 except ImportError:
-    print("ERROR: lxml not installed. Run: pip install lxml")
+    print("ERROR: saxonche not installed. Run: pip install saxonche")
     sys.exit(1)
 
 try:
-    from saxonche import PySaxonProcessor
+    import jpype
 except ImportError:
-    print("ERROR: saxonche not installed. Run: pip install saxonche")
-    sys.exit(1)
+    jpype = None
 
 SCRIPT_DIR = Path(__file__).parent.resolve()
 app = Flask(
@@ -85,10 +99,18 @@ def generate_fop_config():
 FOP_JAR = find_fop()
 JAVA_CMD = find_java()
 HAS_FOP = FOP_JAR is not None and JAVA_CMD is not None
+FOP_CLASSPATH = (
+    os.pathsep.join(str(j) for j in FOP_HOME.glob("*.jar")) if HAS_FOP else ""
+)
+# Cap FOP's heap: the embedded JVM lives as long as the (worker) process
+FOP_MAX_HEAP = os.environ.get("XR_FOP_MAX_HEAP", "512m")
 
 if HAS_FOP:
     print(f"Apache FOP found: {FOP_JAR}")
     print(f"Java found: {JAVA_CMD}")
+    if jpype is None:
+        print("Warning: JPype not installed. FOP will start a new JVM per PDF.")
+        print("\tTo keep FOP loaded: pip install JPype1")
 else:
     if not JAVA_CMD:
         print("Warning: Java not found. PDF export will use browser print.")
@@ -98,33 +120,302 @@ else:
             "\tTo enable native PDF: run 'ant provide-fop' or download FOP to lib/fop/"
         )
 
+
+def write_fop_config():
+    """Write the generated FOP config once and remove it again on exit"""
+    with tempfile.NamedTemporaryFile(
+        mode="w", suffix=".xconf", delete=False, encoding="utf-8"
+    ) as f:
+        f.write(generate_fop_config())
+    atexit.register(os.unlink, f.name)
+    return f.name
+
+
+_FOP_CONFIG_TMP = write_fop_config() if HAS_FOP else None
+
+# Stylesheets for the first (XML -> XR) and second (XR -> HTML/FO) stage
+_XSL_STAGE1 = {
+    "ubl_invoice": XSL_DIR / "ubl-invoice-xr.xsl",
+    "ubl_creditnote": XSL_DIR / "ubl-creditnote-xr.xsl",
+    "cii": XSL_DIR / "cii-xr.xsl",
+}
+_HTML_XSL = XSL_DIR / "xrechnung-html.xsl"
+_PDF_XSL = XSL_DIR / "xr-pdf.xsl"
+
+for xsl in (*_XSL_STAGE1.values(), _HTML_XSL, _PDF_XSL):
+    if not xsl.exists():
+        print(f"ERROR: XSLT not found: {xsl}")
+        print("\tRun: git submodule update --init")
+        sys.exit(1)
+
 # XML namespaces for document type detection
 NAMESPACES = {
     "ubl_invoice": "urn:oasis:names:specification:ubl:schema:xsd:Invoice-2",
     "ubl_creditnote": "urn:oasis:names:specification:ubl:schema:xsd:CreditNote-2",
     "cii": "urn:un:unece:uncefact:data:standard:CrossIndustryInvoice:100",
 }
+ROOT_ELEMENTS = {
+    "ubl_invoice": "Invoice",
+    "ubl_creditnote": "CreditNote",
+    "cii": "CrossIndustryInvoice",
+}
+_ROOT_TO_TYPE = {
+    (NAMESPACES[doc_type].encode(), local.encode()): doc_type
+    for doc_type, local in ROOT_ELEMENTS.items()
+}
+
+_WHITESPACE_RE = re.compile(rb"\s*")
+_START_TAG_RE = re.compile(
+    rb"""<([A-Za-z_][^\s/>=]*)((?:\s+[^\s/>=]+\s*=\s*(?:"[^"]*"|'[^']*'))*)\s*/?>"""
+)
+_ATTRIBUTE_RE = re.compile(rb"""([^\s=]+)\s*=\s*(?:"([^"]*)"|'([^']*)')""")
+# How much of a spilled upload is read while looking for the root element
+DETECT_READ_SIZE = 64 * 1024
+DETECT_MAX_SIZE = 1024 * 1024
+
+
+# One processor for the whole app; it is safe to use from any request thread
+_SAXON_PROC = PySaxonProcessor(license=False)
+atexit.register(_SAXON_PROC.__exit__, None, None, None)
+_XSLT_CACHE = {}
+_XSLT_CACHE_LOCK = threading.Lock()
+
+
+def _get_executable(proc, path):
+    """Return a compiled stylesheet, compiling it only on first use"""
+    key = str(path)
+    with _XSLT_CACHE_LOCK:
+        executable = _XSLT_CACHE.get(key)
+        if executable is None:
+            xslt_proc = proc.new_xslt30_processor()
+            xslt_proc.set_cwd(str(XSL_DIR))
+            executable = xslt_proc.compile_stylesheet(stylesheet_file=key)
+            _XSLT_CACHE[key] = executable
+    # Clone so per-call parameters don't leak between concurrent requests
+    return executable.clone()
+
+
+# Uploads larger than this are spilled to disk instead of read into memory.
+# saxonche only parses str or files, so in-memory uploads cost an extra
+# decoded copy; keep that path to small invoices.
+XML_SPOOL_SIZE = 256 * 1024
+
+
+@contextmanager
+def uploaded_xml(file):
+    """Yield the upload as bytes, or as a temp file path if it is large"""
+    stream = file.stream
+    stream.seek(0, os.SEEK_END)
+    size = stream.tell()
+    stream.seek(0)
+
+    if size <= XML_SPOOL_SIZE:
+        yield stream.read()
+        return
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        xml_path = Path(temp_dir) / "upload.xml"
+        with open(xml_path, "wb") as f:
+            shutil.copyfileobj(stream, f, length=1 << 20)
+        yield xml_path
+
+
+# Languages offered in the UI; their XDM values are created once up front
+LANGUAGES = ("de", "en")
+_LANG_XDM = {lang: _SAXON_PROC.make_string_value(lang) for lang in LANGUAGES}
+
+
+def _get_lang_xdm(proc, lang):
+    """Return the XDM string value for lang, reusing it for known languages"""
+    value = _LANG_XDM.get(lang)
+    if value is None:
+        value = proc.make_string_value(lang)
+    return value
+
+
+def _find_root_start_tag(head):
+    """Skip the prolog in head and match the root element's start tag
+
+    Returns None while head doesn't contain the complete start tag yet, and
+    False if something other than an element follows the prolog.
+    """
+    pos = 3 if head.startswith(b"\xef\xbb\xbf") else 0
+    while True:
+        pos = _WHITESPACE_RE.match(head, pos).end()
+        if head.startswith(b"<?", pos):
+            end = head.find(b"?>", pos + 2)
+            if end < 0:
+                return None
+            pos = end + 2
+        elif head.startswith(b"<!--", pos):
+            end = head.find(b"-->", pos + 4)
+            if end < 0:
+                return None
+            pos = end + 3
+        elif head.startswith(b"<!DOCTYPE", pos):
+            end = head.find(b">", pos)
+            subset = head.find(b"[", pos)
+            if 0 <= subset < end:
+                # Internal subset: the declaration ends at the first "]>"
+                end = head.find(b"]", subset)
+                end = head.find(b">", end) if end >= 0 else -1
+            if end < 0:
+                return None
+            pos = end + 1
+        elif pos >= len(head):
+            return None
+        else:
+            match = _START_TAG_RE.match(head, pos)
+            if match:
+                return match
+            # The tag may just be cut off at the end of head
+            return None if head.find(b">", pos) < 0 else False
+
+
+def _root_document_type(head):
+    """Return the type for the root start tag in head
+
+    False means the root element is not a supported document, None that head
+    doesn't contain the complete start tag yet.
+    """
+    match = _find_root_start_tag(head)
+    if not match:
+        return match
+
+    name, attributes = match.groups()
+    prefix, _, local = name.rpartition(b":")
+    xmlns = b"xmlns:" + prefix if prefix else b"xmlns"
+    for attr, double_quoted, single_quoted in _ATTRIBUTE_RE.findall(attributes):
+        if attr == xmlns:
+            namespace = double_quoted or single_quoted
+            return _ROOT_TO_TYPE.get((namespace, local), False)
+    return False
 
 
 def detect_document_type(xml_content):
-    """Detect the type of XRechnung document"""
-    try:
-        root = etree.fromstring(xml_content)
-        ns = root.tag.split("}")[0].strip("{") if "}" in root.tag else ""
+    """Detect the type of XRechnung document from its root element"""
+    if isinstance(xml_content, bytes):
+        return _root_document_type(xml_content) or None
+
+    head = b""
+    with open(xml_content, "rb") as f:
+        while len(head) < DETECT_MAX_SIZE:
+            chunk = f.read(DETECT_READ_SIZE)
+            if not chunk:
+                break
+            head += chunk
+            doc_type = _root_document_type(head)
+            if doc_type is not None:
+                return doc_type or None
+    return None
+
+
+_XML_ENCODING_RE = re.compile(
+    rb"""\A(?:\xef\xbb\xbf)?<\?xml[^>]*?\bencoding\s*=\s*["']([A-Za-z][\w.-]*)["']"""
+)
+
+
+def _parse_xml_bytes(proc, xml_content):
+    """Parse UTF-8 bytes in memory, anything else via Saxon's file parser"""
+    match = _XML_ENCODING_RE.match(xml_content)
+    encoding = match.group(1).decode("ascii").lower() if match else "utf-8"
+
+    if encoding in ("utf-8", "utf8"):
+        try:
+            xml_text = xml_content.decode("utf-8-sig")
+        except UnicodeDecodeError:
+            pass
+        else:
+            return proc.parse_xml(xml_text=xml_text, encoding="UTF-8")
+
+    # Saxon honours the declared encoding when it reads the document itself
+    with tempfile.TemporaryDirectory() as temp_dir:
+        xml_path = os.path.join(temp_dir, "input.xml")
+        with open(xml_path, "wb") as f:
+            f.write(xml_content)
+        return proc.parse_xml(xml_file_name=xml_path)
+
+
+def transform_to_xr(proc, xml_content, doc_type):
+    """First transformation: XML -> XR intermediate format"""
+    executable1 = _get_executable(proc, _XSL_STAGE1[doc_type])
+
+    if isinstance(xml_content, bytes):
+        xdm_input = _parse_xml_bytes(proc, xml_content)
+    else:
+        xdm_input = proc.parse_xml(xml_file_name=str(xml_content))
+    xr_value = executable1.transform_to_value(xdm_node=xdm_input)
+    xr_node = xr_value.head if xr_value is not None else None
+
+    if xr_node is None:
+        raise RuntimeError("First XSLT transformation failed")
+
+    return xr_node
+
+
+def transform_to_html(proc, xr_node, lang):
+    """Second transformation: XR -> HTML"""
+    executable2 = _get_executable(proc, _HTML_XSL)
+    executable2.set_parameter("lang", _get_lang_xdm(proc, lang))
+
+    html_result = executable2.transform_to_string(xdm_node=xr_node)
+
+    if not html_result:
+        raise RuntimeError("Second XSLT transformation failed")
+
+    return html_result
+
+
+def transform_to_fo(proc, xr_node, lang, fo_path):
+    """Second transformation: XR -> XSL-FO, written to fo_path"""
+    executable2 = _get_executable(proc, _PDF_XSL)
+    executable2.set_parameter("lang", _get_lang_xdm(proc, lang))
+    executable2.set_parameter("foengine", proc.make_string_value("fop"))
+
+    # Serialize the FO straight to the file FOP reads, bypassing Python
+    executable2.transform_to_file(xdm_node=xr_node, output_file=fo_path)
+
+    if not os.path.exists(fo_path) or os.path.getsize(fo_path) == 0:
+        raise RuntimeError("XSL-FO transformation failed")
 
-        if ns == NAMESPACES["ubl_invoice"]:
-            return "ubl_invoice"
-        elif ns == NAMESPACES["ubl_creditnote"]:
-            return "ubl_creditnote"
-        elif ns == NAMESPACES["cii"]:
-            return "cii"
-        return None
-    except Exception:
-        return None
+
+_HTML_CACHE = OrderedDict()
+# Soft cap on the summed length of the cached HTML strings
+_HTML_CACHE_MAX_CHARS = 8 * 1024 * 1024
+_html_cache_chars = 0
+_HTML_CACHE_LOCK = threading.Lock()
+
+
+def _cache_html(cache_key, html_result):
+    """Store html_result, evicting least recently used entries over budget"""
+    global _html_cache_chars
+    if len(html_result) > _HTML_CACHE_MAX_CHARS:
+        return
+
+    with _HTML_CACHE_LOCK:
+        if cache_key in _HTML_CACHE:
+            return
+        _HTML_CACHE[cache_key] = html_result
+        _html_cache_chars += len(html_result)
+        while _html_cache_chars > _HTML_CACHE_MAX_CHARS:
+            _, evicted = _HTML_CACHE.popitem(last=False)
+            _html_cache_chars -= len(evicted)
 
 
 def transform_xml(xml_content, lang="de"):
     """Transform XML to HTML using XSLT"""
+    # Spilled uploads are large and would need an extra full read to hash,
+    # so only in-memory uploads are cached
+    cache_key = None
+    if isinstance(xml_content, bytes):
+        digest = hashlib.blake2b(xml_content, digest_size=16).digest()
+        cache_key = digest + lang.encode()
+        with _HTML_CACHE_LOCK:
+            html_result = _HTML_CACHE.get(cache_key)
+            if html_result is not None:
+                _HTML_CACHE.move_to_end(cache_key)
+                return html_result
+
     doc_type = detect_document_type(xml_content)
     if not doc_type:
         raise ValueError(
@@ -132,52 +423,155 @@ def transform_xml(xml_content, lang="de"):
             "Supported: UBL Invoice, UBL CreditNote, CII/UNCEFACT"
         )
 
-    xsl_mapping = {
-        "ubl_invoice": "ubl-invoice-xr.xsl",
-        "ubl_creditnote": "ubl-creditnote-xr.xsl",
-        "cii": "cii-xr.xsl",
-    }
+    proc = _SAXON_PROC
+    xr_node = transform_to_xr(proc, xml_content, doc_type)
+    html_result = transform_to_html(proc, xr_node, lang)
 
-    first_xsl = XSL_DIR / xsl_mapping[doc_type]
-    html_xsl = XSL_DIR / "xrechnung-html.xsl"
+    if cache_key is not None:
+        _cache_html(cache_key, html_result)
 
-    if not first_xsl.exists():
-        raise FileNotFoundError(f"XSLT not found: {first_xsl}")
-    if not html_xsl.exists():
-        raise FileNotFoundError(f"XSLT not found: {html_xsl}")
+    return html_result
 
-    with PySaxonProcessor(license=False) as proc:
-        xslt_proc = proc.new_xslt30_processor()
-        xslt_proc.set_cwd(str(XSL_DIR))
 
-        # First transformation: XML -> XR intermediate format
-        executable1 = xslt_proc.compile_stylesheet(stylesheet_file=str(first_xsl))
+_FOP_FACTORY = None
+_FOP_EMBEDDED = jpype is not None
+_FOP_LOCK = threading.Lock()
 
-        # Write XML to temp file for transformation
-        with tempfile.NamedTemporaryFile(mode="wb", suffix=".xml", delete=False) as f:
-            f.write(xml_content)
-            temp_xml = f.name
 
-        try:
-            xr_result = executable1.transform_to_string(source_file=temp_xml)
-        finally:
-            os.unlink(temp_xml)
+def _find_jvm_library():
+    """Locate the JVM library belonging to JAVA_CMD, else JPype's default"""
+    java_home = Path(os.path.realpath(JAVA_CMD)).parent.parent
+    for pattern in (
+        "lib/server/libjvm.*",
+        "jre/lib/*/server/libjvm.*",
+        "lib/*/server/libjvm.*",
+        "bin/server/jvm.dll",
+    ):
+        for candidate in java_home.glob(pattern):
+            return str(candidate)
+    return jpype.getDefaultJVMPath()
 
-        if not xr_result:
-            raise RuntimeError("First XSLT transformation failed")
 
-        # Second transformation: XR -> HTML
-        executable2 = xslt_proc.compile_stylesheet(stylesheet_file=str(html_xsl))
-        executable2.set_parameter("lang", proc.make_string_value(lang))
+def _get_fop_factory(config_path):
+    """Start the embedded JVM and create the FopFactory once
 
-        html_result = executable2.transform_to_string(
-            xdm_node=proc.parse_xml(xml_text=xr_result)
+    Returns None when the embedded FOP can't be set up, so callers fall back
+    to running FOP as a java subprocess.
+    """
+    global _FOP_FACTORY, _FOP_EMBEDDED
+    with _FOP_LOCK:
+        if _FOP_FACTORY is None and _FOP_EMBEDDED:
+            try:
+                if not jpype.isJVMStarted():
+                    jpype.startJVM(
+                        _find_jvm_library(),
+                        f"-Xmx{FOP_MAX_HEAP}",
+                        classpath=FOP_CLASSPATH,
+                    )
+                File = jpype.JClass("java.io.File")
+                FopFactory = jpype.JClass("org.apache.fop.apps.FopFactory")
+                _FOP_FACTORY = FopFactory.newInstance(File(config_path))
+            except Exception as e:
+                print(f"Warning: embedded FOP unavailable, using java subprocess: {e}")
+                _FOP_EMBEDDED = False
+    return _FOP_FACTORY
+
+
+def _render_pdf_embedded(fop_factory, fo_path, pdf_path):
+    """Render XSL-FO to PDF with the FopFactory living in this process"""
+    File = jpype.JClass("java.io.File")
+    FileOutputStream = jpype.JClass("java.io.FileOutputStream")
+    BufferedOutputStream = jpype.JClass("java.io.BufferedOutputStream")
+    TransformerFactory = jpype.JClass("javax.xml.transform.TransformerFactory")
+    StreamSource = jpype.JClass("javax.xml.transform.stream.StreamSource")
+    SAXResult = jpype.JClass("javax.xml.transform.sax.SAXResult")
+
+    out = BufferedOutputStream(FileOutputStream(File(pdf_path)))
+    try:
+        fop = fop_factory.newFop("application/pdf", out)
+        transformer = TransformerFactory.newInstance().newTransformer()
+        transformer.transform(
+            StreamSource(File(fo_path)), SAXResult(fop.getDefaultHandler())
         )
+    finally:
+        out.close()
 
-        if not html_result:
-            raise RuntimeError("Second XSLT transformation failed")
 
-        return html_result
+def run_fop(config_path, fo_path, pdf_path):
+    """Render XSL-FO to PDF, preferring the embedded FOP over a java subprocess"""
+    fop_factory = _get_fop_factory(config_path) if _FOP_EMBEDDED else None
+
+    if fop_factory is not None:
+        try:
+            _render_pdf_embedded(fop_factory, fo_path, pdf_path)
+        except Exception as e:
+            raise RuntimeError(f"FOP error: {e}") from e
+        error_msg = "FOP execution failed"
+    else:
+        fop_cmd = [
+            JAVA_CMD,
+            f"-Xmx{FOP_MAX_HEAP}",
+            "-cp",
+            FOP_CLASSPATH,
+            "org.apache.fop.cli.Main",
+            "-c",
+            config_path,
+            "-fo",
+            fo_path,
+            "-pdf",
+            pdf_path,
+        ]
+
+        result = subprocess.run(fop_cmd, capture_output=True, text=True)
+        error_msg = result.stderr or result.stdout or "FOP execution failed"
+
+    if not os.path.exists(pdf_path) or os.path.getsize(pdf_path) == 0:
+        raise RuntimeError(f"FOP error: {error_msg}")
+
+
+WARMUP_DIR = SCRIPT_DIR / "static" / "warmup"
+_WARMUP_FILES = {
+    "ubl_invoice": WARMUP_DIR / "ubl-invoice.xml",
+    "ubl_creditnote": WARMUP_DIR / "ubl-creditnote.xml",
+    "cii": WARMUP_DIR / "cii.xml",
+}
+
+
+def warm_up():
+    """Run every stylesheet (and FOP) once so the first request starts warm"""
+    proc = _SAXON_PROC
+    with tempfile.TemporaryDirectory() as temp_dir:
+        fo_path = os.path.join(temp_dir, "warmup.fo")
+        pdf_path = os.path.join(temp_dir, "warmup.pdf")
+
+        for doc_type, xml_file in _WARMUP_FILES.items():
+            xr_node = transform_to_xr(proc, xml_file.read_bytes(), doc_type)
+            transform_to_html(proc, xr_node, "de")
+            if HAS_FOP:
+                transform_to_fo(proc, xr_node, "de", fo_path)
+
+        if HAS_FOP:
+            run_fop(_FOP_CONFIG_TMP, fo_path, pdf_path)
+
+
+class _CleanupFile(io.FileIO):
+    """Read-only file that runs cleanup once the response has closed it
+
+    send_file responses bypass call_on_close, and an open file can't be
+    removed on Windows, so the temp file is removed from close() instead.
+    """
+
+    def __init__(self, path, cleanup):
+        super().__init__(path, "rb")
+        self._cleanup = cleanup
+
+    def close(self):
+        try:
+            super().close()
+        finally:
+            if self._cleanup is not None:
+                cleanup, self._cleanup = self._cleanup, None
+                cleanup()
 
 
 @app.route("/")
@@ -198,9 +592,13 @@ def transform():
     lang = request.form.get("lang", "de")
 
     try:
-        xml_content = file.read()
-        html = transform_xml(xml_content, lang)
-        return jsonify({"html": html, "filename": file.filename})
+        with uploaded_xml(file) as xml_content:
+            html = transform_xml(xml_content, lang)
+        return Response(
+            html,
+            mimetype="text/html",
+            headers={"X-Filename": quote(file.filename)},
+        )
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
@@ -221,118 +619,46 @@ def export_pdf():
     lang = request.form.get("lang", "de")
 
     try:
-        xml_content = file.read()
-        doc_type = detect_document_type(xml_content)
-        if not doc_type:
-            raise ValueError("Unknown XML format")
-
-        xsl_mapping = {
-            "ubl_invoice": "ubl-invoice-xr.xsl",
-            "ubl_creditnote": "ubl-creditnote-xr.xsl",
-            "cii": "cii-xr.xsl",
-        }
-
-        first_xsl = XSL_DIR / xsl_mapping[doc_type]
-        pdf_xsl = XSL_DIR / "xr-pdf.xsl"
-
-        with PySaxonProcessor(license=False) as proc:
-            xslt_proc = proc.new_xslt30_processor()
-            xslt_proc.set_cwd(str(XSL_DIR))
+        with uploaded_xml(file) as xml_content:
+            doc_type = detect_document_type(xml_content)
+            if not doc_type:
+                raise ValueError("Unknown XML format")
 
-            # First transformation: XML -> XR intermediate format
-            executable1 = xslt_proc.compile_stylesheet(stylesheet_file=str(first_xsl))
+            proc = _SAXON_PROC
+            xr_node = transform_to_xr(proc, xml_content, doc_type)
 
-            # Write XML to temp file for transformation
-            with tempfile.NamedTemporaryFile(
-                mode="wb", suffix=".xml", delete=False
-            ) as f:
-                f.write(xml_content)
-                temp_xml = f.name
-
-            try:
-                xr_result = executable1.transform_to_string(source_file=temp_xml)
-            finally:
-                os.unlink(temp_xml)
-
-            if not xr_result:
-                raise RuntimeError("First XSLT transformation failed")
-
-            # Second transformation: XR -> XSL-FO
-            executable2 = xslt_proc.compile_stylesheet(stylesheet_file=str(pdf_xsl))
-            executable2.set_parameter("lang", proc.make_string_value(lang))
-            executable2.set_parameter("foengine", proc.make_string_value("fop"))
-
-            fo_result = executable2.transform_to_string(
-                xdm_node=proc.parse_xml(xml_text=xr_result)
+        # The FO file goes with the TemporaryDirectory, while the PDF's
+        # directory is removed when the response closes the file
+        pdf_dir = tempfile.mkdtemp()
+        try:
+            with tempfile.TemporaryDirectory() as temp_dir:
+                temp_fo = os.path.join(temp_dir, "input.fo")
+                temp_pdf = os.path.join(pdf_dir, "out.pdf")
+                transform_to_fo(proc, xr_node, lang, temp_fo)
+                run_fop(_FOP_CONFIG_TMP, temp_fo, temp_pdf)
+            pdf_file = _CleanupFile(
+                temp_pdf, lambda: shutil.rmtree(pdf_dir, ignore_errors=True)
             )
+        except BaseException:
+            shutil.rmtree(pdf_dir, ignore_errors=True)
+            raise
 
-            if not fo_result:
-                raise RuntimeError("XSL-FO transformation failed")
-
-        with tempfile.NamedTemporaryFile(
-            mode="w", suffix=".fo", delete=False, encoding="utf-8"
-        ) as f:
-            f.write(fo_result)
-            temp_fo = f.name
-
-        temp_pdf = tempfile.NamedTemporaryFile(
-            mode="wb", suffix=".pdf", delete=False
-        ).name
-
-        with tempfile.NamedTemporaryFile(
-            mode="w", suffix=".xconf", delete=False, encoding="utf-8"
-        ) as f:
-            f.write(generate_fop_config())
-            temp_fop_config = f.name
+        filename = (
+            file.filename.replace(".xml", ".pdf") if file.filename else "xrechnung.pdf"
+        )
 
         try:
-            fop_jars = list(FOP_HOME.glob("*.jar"))
-            classpath = os.pathsep.join(str(j) for j in fop_jars)
-
-            # Run FOP
-            fop_cmd = [
-                JAVA_CMD,
-                "-cp",
-                classpath,
-                "org.apache.fop.cli.Main",
-                "-c",
-                temp_fop_config,
-                "-fo",
-                temp_fo,
-                "-pdf",
-                temp_pdf,
-            ]
-
-            result = subprocess.run(fop_cmd, capture_output=True, text=True)
-
-            if os.path.exists(temp_pdf) and os.path.getsize(temp_pdf) > 0:
-                with open(temp_pdf, "rb") as f:
-                    pdf_content = f.read()
-
-                filename = (
-                    file.filename.replace(".xml", ".pdf")
-                    if file.filename
-                    else "xrechnung.pdf"
-                )
-
-                return Response(
-                    pdf_content,
-                    mimetype="application/pdf",
-                    headers={
-                        "Content-Disposition": f'attachment; filename="{filename}"'
-                    },
-                )
-            else:
-                error_msg = result.stderr or result.stdout or "FOP execution failed"
-                raise RuntimeError(f"FOP error: {error_msg}")
-
-        finally:
-            if os.path.exists(temp_fo):
-                os.unlink(temp_fo)
-            if os.path.exists(temp_pdf):
-                os.unlink(temp_pdf)
-            if os.path.exists(temp_fop_config):
-                os.unlink(temp_fop_config)
+            response = send_file(
+                pdf_file,
+                mimetype="application/pdf",
+                as_attachment=True,
+                download_name=filename,
+            )
+            response.content_length = os.fstat(pdf_file.fileno()).st_size
+        except BaseException:
+            pdf_file.close()
+            raise
+        return response
 
     except Exception as e:
         return jsonify({"error": str(e)}), 500
@@ -353,8 +679,22 @@ if __name__ == "__main__":
     parser.add_argument(
         "--dev", action="store_true", help="Run in development mode (Flask dev server)"
     )
+    # saxonche keeps the GIL for the whole transformation, so extra threads
+    # only help with concurrent uploads; use gunicorn.conf.py for multi-core
+    parser.add_argument(
+        "--threads",
+        type=int,
+        default=4,
+        help="Waitress worker threads (default: 4)",
+    )
     args = parser.parse_args()
 
+    print("Warming up XSLT stylesheets...")
+    try:
+        warm_up()
+    except Exception as e:
+        print(f"Warning: warm-up failed: {e}")
+
     print("=" * 60)
     print("XRechnung Viewer")
     print("=" * 60)
@@ -370,4 +710,4 @@ if __name__ == "__main__":
         from waitress import serve
 
         print("Running with Waitress (production server)")
-        serve(app, host=args.host, port=args.port)
+        serve(app, host=args.host, port=args.port, threads=args.threads)